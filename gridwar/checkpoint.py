@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+"""
+Saves and restores the state of long running simulations of Gridwar.
+"""
+
+import os
+import pickle
+import time
+
+from gridwar.utils import GameError
+
+class Checkpoint:
+    """
+    Periodically writes the state of a simulation to a file so it can be resumed. Like the
+    progress reporting, saving is sampled by time so due() is cheap to call after every game.
+    """
+    __slots__ = ('path', 'interval', 'next_save')
+
+    def __init__(self, path, interval=60.0):
+        self.path = path
+        self.interval = interval
+        self.next_save = time.time() + interval
+
+    def due(self):
+        """
+        Returns true if the checkpoint interval has elapsed.
+        """
+        return time.time() >= self.next_save
+
+    def save(self, state):
+        """
+        Write the state out. This is written to a temporary file first which then replaces the
+        checkpoint, so a simulation killed part way through saving leaves the last one intact.
+        """
+        tmp_path = "{}.tmp".format(self.path)
+        with open(tmp_path, 'wb') as myfile:
+            pickle.dump(state, myfile)
+            myfile.flush()
+            os.fsync(myfile.fileno())
+        os.replace(tmp_path, self.path)
+        self.next_save = time.time() + self.interval
+
+    def load(self):
+        """
+        Read the state back from the checkpoint.
+        """
+        try:
+            with open(self.path, 'rb') as myfile:
+                return pickle.load(myfile)
+        except (OSError, pickle.UnpicklingError, EOFError) as err:
+            raise GameError("Failed to read checkpoint '{}': {}".format(self.path, err))
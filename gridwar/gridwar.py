@@ -3,6 +3,8 @@
 """
 Manage classes for handling overall game control of Gridwar.
 """
+import math
+import random
 import time
 
 from gridwar.player import Player
@@ -12,9 +14,11 @@ class Game:
     """
     Manages the playing of all the games between the two players.
     """
-    __slots__ = ('size', 'num_games', 'layouts', 'plays', 'pieces', 'wins', 'tries', 'verbose', 'start_time')
+    __slots__ = ('size', 'num_games', 'layouts', 'plays', 'pieces', 'play_params', 'wins', 'tries', 'verbose', 'start_time',
+                 'progress', 'pairs', 'pair_diffs', 'shot_diffs', 'shots', 'first_wins', 'checkpoint', 'games_done')
 
-    def __init__(self, width, height, num_games, pieces, p1_layout, p1_play, p2_layout, p2_play, verbose):
+    def __init__(self, width, height, num_games, pieces, p1_layout, p1_play, p2_layout, p2_play, verbose,
+                 progress=None, play_params=(None, None), checkpoint=None):
         # Do some validation of playing pieces
         for k, p in pieces.items():
             if p < 1:
@@ -29,10 +33,25 @@ class Game:
         self.layouts = (p1_layout, p2_layout)
         self.plays = (p1_play, p2_play)
         self.pieces = pieces
+        self.play_params = play_params
         self.wins = [0, 0]
         self.tries = [0, 0]
         self.verbose = verbose
         self.start_time = 0
+        self.progress = progress
+        # Sum and sum of squares of player one's wins minus player two's over each mirrored
+        # pair of games (only used when playing paired games)
+        self.pairs = 0
+        self.pair_diffs = [0, 0]
+        # Sum and sum of squares of the number of shots player one needs to sink a fleet minus
+        # the number player two needs on the same board, averaged over the boards of each pair,
+        # along with the sum and sum of squares of each player's shots on its own
+        self.shot_diffs = [0, 0]
+        self.shots = [[0, 0], [0, 0]]
+        self.first_wins = 0
+        self.checkpoint = checkpoint
+        # Number of games (or pairs of games) played so far, which is not zero after resuming
+        self.games_done = 0
 
         if self.verbose: print(self)
 
@@ -41,39 +60,186 @@ class Game:
                 "Number of games is {}\n".format(self.num_games) +
                 "Game pieces are: {}\n".format(self.pieces))
 
+    def print_header(self, num_games):
+        """
+        Print out what is about to be played.
+        """
+        print("Board size: {}x{} with {} games using pieces: {}".format(self.size[0], self.size[1], num_games, self.pieces))
+        for i in range(2):
+            print("Player {} using layout '{}' and play strategy '{}'{}".format(
+                i+1, self.layouts[i], self.plays[i],
+                " with parameters {}".format(self.play_params[i]) if self.play_params[i] else ""))
+        print("Running...")
+
+    def settings(self):
+        """
+        Returns the settings that must match for a simulation to be resumed from a checkpoint.
+        """
+        return {"size": self.size, "layouts": self.layouts, "plays": self.plays, "pieces": self.pieces,
+                "play_params": self.play_params}
+
+    def save_checkpoint(self, mode):
+        """
+        Save the statistics gathered so far along with the state of the random number generator.
+        """
+        self.checkpoint.save({"mode": mode, "settings": self.settings(), "games_done": self.games_done,
+                              "wins": self.wins, "tries": self.tries, "pairs": self.pairs,
+                              "pair_diffs": self.pair_diffs, "shot_diffs": self.shot_diffs,
+                              "shots": self.shots, "first_wins": self.first_wins,
+                              "elapsed": time.time() - self.start_time, "random_state": random.getstate()})
+
+    def resume(self, mode):
+        """
+        Restore the state of a simulation from its last checkpoint. The random number generator
+        is restored as well, so the rest of the simulation plays out exactly as it would have
+        done without being interrupted.
+        """
+        state = self.checkpoint.load()
+        if state["mode"] != mode:
+            raise GameError("Checkpoint '{}' is for {} games and cannot be resumed as {} games".
+                            format(self.checkpoint.path, state["mode"], mode))
+        if state["settings"] != self.settings():
+            raise GameError("Checkpoint '{}' was saved with different settings: {}".
+                            format(self.checkpoint.path, state["settings"]))
+        if state["games_done"] > self.num_games:
+            raise GameError("Checkpoint '{}' has already played {} games which is more than {}".
+                            format(self.checkpoint.path, state["games_done"], self.num_games))
+
+        self.games_done = state["games_done"]
+        self.wins = state["wins"]
+        self.tries = state["tries"]
+        self.pairs = state["pairs"]
+        self.pair_diffs = state["pair_diffs"]
+        self.shot_diffs = state["shot_diffs"]
+        self.shots = state["shots"]
+        self.first_wins = state["first_wins"]
+        self.start_time = time.time() - state["elapsed"]
+        random.setstate(state["random_state"])
+        print("Resuming from checkpoint '{}' after {} games".format(self.checkpoint.path, self.games_done))
+
+    def play_game(self, players):
+        """
+        Plays a single game between two players, the first of which starts. Returns the index
+        of the winning player and the round they won on.
+        """
+        game_round = 0
+        while True:
+            game_round += 1
+            for i in range(2):
+                player = players[i]
+                opponent = players[0] if i == 1 else players[1]
+
+                attack_pos = player.get_next_attack()
+                player.set_attack_result(attack_pos, *opponent.is_hit(attack_pos))
+
+                if opponent.is_player_dead() is True:
+                    if self.verbose: print("Player {} won the game on round {}\n".format(i+1, game_round))
+                    return i, game_round
+
     def play(self):
         """
         Plays a number of games (as set-up already in the class).
         """
-        print("Board size: {}x{} with {} games using pieces: {}".format(self.size[0], self.size[1], self.num_games, self.pieces))
-        print("Player 1 using layout '{}' and play strategy '{}'".format(self.layouts[0], self.plays[0]))
-        print("Player 2 using layout '{}' and play strategy '{}'".format(self.layouts[1], self.plays[1]))
-        print("Running...")
-        self.start_time = time.time()
+        self.print_header(self.num_games)
+        if self.games_done == 0:
+            self.start_time = time.time()
+        if self.progress is not None:
+            self.progress.start(self.games_done)
 
-        for game in range(self.num_games):
+        for game in range(self.games_done, self.num_games):
             if self.verbose: print("Playing game {}:".format(game))
-            players = (Player("Player 1", self.size[0], self.size[1], self.pieces, self.layouts[0], self.plays[0], self.verbose),
-                       Player("Player 2", self.size[0], self.size[1], self.pieces, self.layouts[1], self.plays[1], self.verbose))
+            players = (Player("Player 1", self.size[0], self.size[1], self.pieces, self.layouts[0], self.plays[0], self.verbose,
+                              self.play_params[0]),
+                       Player("Player 2", self.size[0], self.size[1], self.pieces, self.layouts[1], self.plays[1], self.verbose,
+                              self.play_params[1]))
 
-            finished = False
-            game_round = 0
+            winner, game_round = self.play_game(players)
+            self.wins[winner] += 1
+            self.tries[winner] += game_round
+            self.games_done = game + 1
 
-            while not finished:
-                game_round += 1
-                for i in range(2):
-                    player = players[i]
-                    opponent = players[0] if i == 1 else players[1]
+            if self.progress is not None:
+                self.progress.update(game + 1, self.num_games, self.wins)
+            if self.checkpoint is not None and self.checkpoint.due():
+                self.save_checkpoint("single")
 
-                    attack_pos = player.get_next_attack()
-                    player.set_attack_result(attack_pos, *opponent.is_hit(attack_pos))
+        if self.progress is not None:
+            self.progress.report(time.time(), self.num_games, self.num_games, self.wins)
+        if self.checkpoint is not None:
+            self.save_checkpoint("single")
 
-                    if opponent.is_player_dead() is True:
-                        self.wins[i] += 1
-                        self.tries[i] += game_round
-                        finished = True
-                        if self.verbose: print("Player {} won the game on round {}\n".format(i+1, game_round))
-                        break
+    def play_paired(self):
+        """
+        Plays the games in mirrored pairs using common random numbers. Both games of a pair use
+        the same two boards, with each seat's board (and the random numbers its player then
+        uses for play) coming from that seat's own seeded generator. In the second game the
+        play strategies swap seats, so each strategy attacks the same boards with the same
+        random numbers and each gets to shoot first once. Results are tallied per strategy.
+        The loser of each game carries on shooting until it too sinks its opponent's fleet,
+        so the number of shots each strategy needs can be compared board by board.
+        """
+        # Layouts stay with the seat while the plays swap, so only the plays are compared
+        if self.layouts[0] != self.layouts[1]:
+            raise GameError("Paired games compare play strategies so both players must use the same layout "
+                            "(not '{}' and '{}')".format(self.layouts[0], self.layouts[1]))
+        self.print_header(self.num_games * 2)
+        print("Playing {} mirrored pairs of games, with the play strategies swapping seats".format(self.num_games))
+        if self.games_done == 0:
+            self.start_time = time.time()
+        if self.progress is not None:
+            self.progress.start(2 * self.games_done)
+
+        for pair in range(self.games_done, self.num_games):
+            seeds = (random.getrandbits(64), random.getrandbits(64))
+            pair_wins = [0, 0]
+            pair_shots = [0, 0]
+            for first in range(2):
+                if self.verbose: print("Playing game {} of pair {}:".format(first, pair))
+                # Strategy s sits in seat s in the first game and the other seat in the second
+                strategies = (first, 1 - first)
+                players = tuple(Player("Player {}".format(strategies[seat]+1), self.size[0], self.size[1], self.pieces,
+                                       self.layouts[seat], self.plays[strategies[seat]], self.verbose,
+                                       self.play_params[strategies[seat]], random.Random(seeds[seat]))
+                                for seat in range(2))
+
+                winner, game_round = self.play_game(players)
+                # The second player has had one shot less if the first player won
+                shots = [game_round, game_round]
+                if winner == 0:
+                    shots[1] -= 1
+                loser = 1 - winner
+                shots[loser] += sink_fleet(players[loser], players[winner])
+                for seat in range(2):
+                    strategy = strategies[seat]
+                    pair_shots[strategy] += shots[seat]
+                    self.shots[strategy][0] += shots[seat]
+                    self.shots[strategy][1] += shots[seat] * shots[seat]
+
+                if winner == 0:
+                    self.first_wins += 1
+                winner = strategies[winner]
+                pair_wins[winner] += 1
+                self.wins[winner] += 1
+                self.tries[winner] += game_round
+
+            diff = pair_wins[0] - pair_wins[1]
+            self.pairs += 1
+            self.pair_diffs[0] += diff
+            self.pair_diffs[1] += diff * diff
+            diff = (pair_shots[0] - pair_shots[1]) / 2.0
+            self.shot_diffs[0] += diff
+            self.shot_diffs[1] += diff * diff
+            self.games_done = pair + 1
+
+            if self.progress is not None:
+                self.progress.update(2 * (pair + 1), 2 * self.num_games, self.wins)
+            if self.checkpoint is not None and self.checkpoint.due():
+                self.save_checkpoint("paired")
+
+        if self.progress is not None:
+            self.progress.report(time.time(), 2 * self.num_games, 2 * self.num_games, self.wins)
+        if self.checkpoint is not None:
+            self.save_checkpoint("paired")
 
     def display_stats(self):
         """
@@ -85,3 +251,68 @@ class Game:
             if win:
                 average = float(self.tries[i]) / win
             print("Player {} wins: {} with (average number of rounds: {:.2f})".format(i+1, win, average))
+
+    def display_paired_stats(self):
+        """
+        Print out the paired differences between the two strategies along with their standard
+        errors, comparing them against what independent games would have given.
+        """
+        if self.pairs < 2:
+            print("Not enough pairs of games played to estimate the standard error")
+            return
+        games = 2 * self.pairs
+        mean = float(self.pair_diffs[0]) / self.pairs
+        variance = (self.pair_diffs[1] - self.pairs * mean * mean) / (self.pairs - 1)
+        std_err = math.sqrt(variance / self.pairs)
+        # Each pair is two games so halve the difference in wins to give the difference in win rate
+        diff, diff_err = mean / 2, std_err / 2
+        # Standard error of the same difference measured from the same number of independent games
+        rate = float(self.wins[0]) / games
+        independent_err = 2 * math.sqrt(rate * (1 - rate) / (games - 1))
+
+        print("Paired difference in win rate (player 1 - player 2): {:+.4f} +/- {:.4f} (standard error)".
+              format(diff, diff_err))
+        print("Independent games would give a standard error of {:.4f}".format(independent_err))
+        if diff_err > 0:
+            print("Equivalent to {:.2f} times as many independent games".format((independent_err / diff_err) ** 2))
+        print("Player to shoot first won {} of {} games".format(self.first_wins, games))
+
+        # The same for the number of shots needed to sink a fleet, where each strategy played
+        # two boards per pair
+        mean = self.shot_diffs[0] / self.pairs
+        variance = (self.shot_diffs[1] - self.pairs * mean * mean) / (self.pairs - 1)
+        diff_err = math.sqrt(variance / self.pairs)
+        independent_err = 0
+        for total, squares in self.shots:
+            average = float(total) / games
+            independent_err += (squares - games * average * average) / (games - 1) / games
+        independent_err = math.sqrt(independent_err)
+
+        print("Paired difference in shots to sink a fleet (player 1 - player 2): {:+.3f} +/- {:.3f} (standard error)".
+              format(mean, diff_err))
+        print("Independent games would give a standard error of {:.3f}".format(independent_err))
+        if diff_err > 0:
+            print("Equivalent to {:.2f} times as many independent games".format((independent_err / diff_err) ** 2))
+
+def sink_fleet(attacker, defender):
+    """
+    Keeps one player attacking another until all the defender's pieces are sunk, returning the
+    number of shots taken.
+    """
+    shots = 0
+    while not defender.is_player_dead():
+        shots += 1
+        attack_pos = attacker.get_next_attack()
+        attacker.set_attack_result(attack_pos, *defender.is_hit(attack_pos))
+    return shots
+
+def shots_to_kill(width, height, pieces, layout, play, play_params=None):
+    """
+    Plays one side of a game, returning the number of shots a play strategy needs to sink all
+    the pieces of a board set-up with the given layout. The two players of a game never
+    influence each other so this is all that is needed to judge a play strategy.
+    """
+    # Only the defender needs a fleet and only the attacker needs to play
+    attacker = Player("Attacker", width, height, pieces, None, play, False, play_params)
+    defender = Player("Defender", width, height, pieces, layout, None, False)
+    return sink_fleet(attacker, defender)
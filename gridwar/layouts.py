@@ -4,9 +4,15 @@
 Manages the different layouts that a player can use to position its pieces.
 """
 
-import random
+import time
+
 from gridwar.utils import GameError
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class LayoutBase:
     """
     Base class used to describe all layouts.
@@ -50,6 +56,12 @@ class LayoutBase:
                 return c
         return None
 
+    # Number of times the whole fleet is laid out piece by piece before falling back to
+    # searching for an arrangement, and the time (in seconds) the search may take (which can be
+    # changed with --fleet-time-limit)
+    fleet_attempts = 10
+    fleet_time_limit = 5.0
+
     def __init__(self, player):
         self.player = player
 
@@ -63,6 +75,181 @@ class LayoutBase:
         """
         return False
 
+    def fits(self, size, vertical, pos):
+        """
+        Checks if the layout allows a piece to be placed at a position.
+        """
+        return self.player.check_place_piece(size, vertical, pos)
+
+    def place_piece(self, key, size, vertical, pos):
+        """
+        Place a piece on the player's board. Layouts keeping their own record of the board
+        update it here.
+        """
+        self.player.place_piece(key, size, vertical, pos)
+
+    def remove_piece(self, size, vertical, pos):
+        """
+        Remove a piece from the player's board.
+        """
+        self.player.remove_piece(size, vertical, pos)
+
+    def clear_board(self):
+        """
+        Remove all the pieces from the player's board.
+        """
+        self.player.clear_board()
+
+    def space_needed(self, size):
+        """
+        Amount of space a piece takes up.
+        """
+        return size
+
+    def space_in(self, cells=None):
+        """
+        Amount of space the pieces placed within a set of positions (or anywhere on the board)
+        can take up between them.
+        """
+        if cells is None:
+            return self.player.board.width * self.player.board.height
+        return len(cells)
+
+    def enough_space(self, pieces, cells=None):
+        """
+        Quick check that the board (or just the given set of positions, if any) is big enough
+        for the pieces.
+        """
+        return sum(self.space_needed(p) for p in pieces.values()) <= self.space_in(cells)
+
+    @staticmethod
+    def covers(size, vertical, pos):
+        """
+        Lists the positions a piece covers.
+        """
+        if vertical:
+            return [(pos[0], pos[1] + i) for i in range(size)]
+        return [(pos[0] + i, pos[1]) for i in range(size)]
+
+    def candidates(self, size):
+        """
+        Lists every orientation and position where the layout currently allows a piece to go.
+        """
+        board = self.player.board
+        ret = [(False, (x, y)) for y in range(board.height) for x in range(board.width - size + 1)
+               if self.fits(size, False, (x, y))]
+        if size > 1:
+            ret += [(True, (x, y)) for y in range(board.height - size + 1) for x in range(board.width)
+                    if self.fits(size, True, (x, y))]
+        return ret
+
+    def place_fleet(self, pieces):
+        """
+        Place all the pieces on the board. The pieces are laid out one at a time with place()
+        and if that gets stuck the board is cleared and tried again. Should that keep failing
+        the fleet is placed by a backtracking search, which is bound to find an arrangement if
+        one exists. A GameError is raised if the search proves there is no arrangement or it
+        runs out of time.
+        """
+        board = self.player.board
+        if not self.enough_space(pieces):
+            raise GameError("Pieces {} cannot be placed using layout '{}' as they need more space than a {}x{} board".
+                            format(pieces, self, board.width, board.height))
+
+        for _ in range(self.fleet_attempts):
+            if all(self.place(k, p) is True for k, p in pieces.items()):
+                return
+            self.clear_board()
+
+        # The search works through the positions in rows, starting from a random corner
+        flip = (self.player.rng.randint(0, 1), self.player.rng.randint(0, 1))
+        scan = {(x, y): (board.height - 1 - y if flip[1] else y, board.width - 1 - x if flip[0] else x)
+                for y in range(board.height) for x in range(board.width)}
+        deadline = time.time() + self.fleet_time_limit
+        found = self._search(dict(pieces), set(), scan, deadline)
+        if found is None:
+            raise GameError("Gave up placing pieces {} using layout '{}' after {} seconds".
+                            format(pieces, self, self.fleet_time_limit))
+        if not found:
+            raise GameError("Pieces {} cannot be placed using layout '{}' on a {}x{} board".
+                            format(pieces, self, board.width, board.height))
+
+    def _search(self, remaining, excluded, scan, deadline):
+        """
+        Places the remaining pieces, undoing a placement whenever the pieces after it cannot be
+        placed. The first position (in scan order) a piece could still cover is either covered
+        by one of the remaining pieces or left empty (excluded from then on). Each arrangement
+        is only searched once, as pieces of the same size are interchangeable. Returns None if
+        the search runs out of time.
+        """
+        if not remaining:
+            return True
+
+        added = []
+        while True:
+            if time.time() > deadline:
+                return None
+
+            options = {}
+            for size in set(remaining.values()):
+                options[size] = [(vertical, pos) for vertical, pos in self.candidates(size)
+                                 if excluded.isdisjoint(self.covers(size, vertical, pos))]
+            if not self._room_for(remaining, options):
+                break
+
+            first = min((cell for size, candidates in options.items() for vertical, pos in candidates
+                         for cell in self.covers(size, vertical, pos)), key=lambda cell: scan[cell])
+            branches = [(size, vertical, pos) for size, candidates in options.items()
+                        for vertical, pos in candidates if first in self.covers(size, vertical, pos)]
+            self.player.rng.shuffle(branches)
+
+            for size, vertical, pos in branches:
+                key = next(k for k, p in remaining.items() if p == size)
+                del remaining[key]
+                self.place_piece(key, size, vertical, pos)
+                found = self._search(remaining, excluded, scan, deadline)
+                if found is not False:
+                    return found
+                self.remove_piece(size, vertical, pos)
+                remaining[key] = size
+
+            excluded.add(first)
+            added.append(first)
+
+        excluded.difference_update(added)
+        return False
+
+    def _room_for(self, remaining, options):
+        """
+        Checks every remaining piece still has somewhere to go, and that the positions they
+        could cover leave enough space for them all. A piece lies within one connected area of
+        these positions, so an area only counts for as much space as some of the remaining
+        pieces can fill exactly.
+        """
+        cells = set()
+        for size, candidates in options.items():
+            if not candidates:
+                return False
+            for vertical, pos in candidates:
+                cells.update(self.covers(size, vertical, pos))
+
+        # Bit n is set if some of the pieces take up a space of n between them
+        needed = [self.space_needed(p) for p in remaining.values()]
+        fillable = 1
+        for space in needed:
+            fillable |= fillable << space
+
+        usable = 0
+        while cells:
+            area = [cells.pop()]
+            for x, y in area:
+                for pos in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if pos in cells:
+                        cells.remove(pos)
+                        area.append(pos)
+            usable += (fillable & ((2 << self.space_in(area)) - 1)).bit_length() - 1
+        return sum(needed) <= usable
+
 class LayoutRandom(LayoutBase):
     """
     Places pieces randomly over the board.
@@ -78,18 +265,22 @@ class LayoutRandom(LayoutBase):
         """
         Tries to place a piece on the board.
         """
-        if random.randint(0, 1) == 0:
+        if self.player.rng.randint(0, 1) == 0:
             width, height = self.player.board.width, self.player.board.height - size
             vertical = True
         else:
             width, height = self.player.board.width - size, self.player.board.height
             vertical = False
+        # Positions in the last row (or column) a piece can reach are never picked, so a piece
+        # as long as the board is left for place_fleet() to search for
+        if width < 1 or height < 1:
+            return False
         # It would be nice not to have to keep retrying until the piece fits
         # but this seems like a simple compromise for the time being
         for _ in range(0, 100):
-            pos = (random.randint(0, width - 1), random.randint(0, height - 1))
+            pos = (self.player.rng.randint(0, width - 1), self.player.rng.randint(0, height - 1))
             if self.player.check_place_piece(size, vertical, pos) is True:
-                self.player.place_piece(key, size, vertical, pos)
+                self.place_piece(key, size, vertical, pos)
                 return True
         return False
 
@@ -106,37 +297,191 @@ class LayoutRandomGap(LayoutBase):
         """
         return "Positions ships randomly, avoiding overlap and keeping a buffer of one space around each"
 
-    def place(self, key, size):
+    def fits(self, size, vertical, pos):
         """
-        Tries to place a piece on the board.
+        Checks the piece could be placed at the position and at every position next to it that
+        is on the board, which leaves a space around it.
         """
         offsets = ((1, 1), (1, 0), (1, -1), (0, 1), (0, 0), (0, -1), (-1, 1), (-1, 0), (-1, -1))
 
         apply_offset = lambda x, y: (x[0]+y[0], x[1]+y[1])
         outside_board = lambda p: bool((p[0] < 0 or p[0] >= self.player.board.width or
                                         p[1] < 0 or p[1] >= self.player.board.height))
+        for o in offsets:
+            test_offset = apply_offset(pos, o)
+            if (self.player.check_place_piece(size, vertical, test_offset) is False and
+                    outside_board(test_offset) is False):
+                return False
+        return True
+
+    def space_needed(self, size):
+        """
+        Amount of space a piece takes up. Along with the buffer below and to the right of it a
+        piece covers (size + 1) x 2 spaces, and these areas cannot overlap.
+        """
+        return 2 * (size + 1)
+
+    def space_in(self, cells=None):
+        """
+        Amount of space the pieces placed within a set of positions (or anywhere on the board)
+        can take up between them, which is the positions along with those below and to the right
+        of them.
+        """
+        if cells is None:
+            return (self.player.board.width + 1) * (self.player.board.height + 1)
+        return len(set((x + i, y + j) for x, y in cells for i in (0, 1) for j in (0, 1)))
+
+    def place(self, key, size):
+        """
+        Tries to place a piece on the board.
+        """
         # Not the cleverest way of doing this but try a 100 times to set the piece. Always
         # vary the orientation to increase the chance of success
         for _ in range(0, 100):
-            if random.randint(0, 1) == 0:
+            if self.player.rng.randint(0, 1) == 0:
                 width, height = self.player.board.width, self.player.board.height - size
                 vertical = True
             else:
                 width, height = self.player.board.width - size, self.player.board.height
                 vertical = False
-            pos = (random.randint(0, width - 1), random.randint(0, height - 1))
-            collide = False
-            for o in offsets:
-                test_offset = apply_offset(pos, o)
-                if (self.player.check_place_piece(size, vertical, test_offset) is False and
-                        outside_board(test_offset) is False):
-                    collide = True
-                    break
-
-            if not collide:
-                self.player.place_piece(key, size, vertical, pos)
+            if width < 1 or height < 1:
+                continue
+            pos = (self.player.rng.randint(0, width - 1), self.player.rng.randint(0, height - 1))
+            if self.fits(size, vertical, pos):
+                self.place_piece(key, size, vertical, pos)
                 return True
 
         return False
 
 LayoutBase.register(LayoutRandomGap)
+
+class LayoutRandomGapArray(LayoutRandomGap):
+    """
+    Places pieces randomly over the board keeping a buffer around each piece (like
+    LayoutRandomGap) but does so by holding the blocked positions (those occupied or next to
+    something that is) in a NumPy array, which is kept up to date as pieces are placed. Every
+    position a piece can go is then found in one pass of a sliding window over the array.
+
+    Positions are picked the same way as LayoutRandomGap, but the buffer is only checked
+    against other pieces. LayoutRandomGap also never lets a piece end at the right (or bottom)
+    edge of the board, which this layout does.
+    """
+    # Number of random positions tried before finding every valid position
+    place_attempts = 10
+
+    def __init__(self, player):
+        super(LayoutRandomGapArray, self).__init__(player)
+        self.occupied = np.zeros((player.board.height, player.board.width), dtype=bool)
+        self.blocked = np.zeros((player.board.height, player.board.width), dtype=bool)
+
+    @classmethod
+    def desc(cls):
+        """
+        String description of what this layout does.
+        """
+        return ("Like random gap but pieces can also reach the right and bottom edges, finding valid positions "
+                "using array operations (needs NumPy)")
+
+    def _dilate(self):
+        """
+        Works out the blocked positions from scratch, which is only needed once a piece has been
+        removed as the buffers of neighbouring pieces can overlap.
+        """
+        padded = np.pad(self.occupied, 1)
+        rows = padded[:, :-2] | padded[:, 1:-1] | padded[:, 2:]
+        self.blocked = rows[:-2, :] | rows[1:-1, :] | rows[2:, :]
+
+    @staticmethod
+    def anchors(blocked, size):
+        """
+        Returns a boolean array marking where a piece of the given size can start along each row
+        without covering any blocked position.
+        """
+        starts = max(blocked.shape[1] - size + 1, 0)
+        free = ~blocked
+        ret = free[:, :starts].copy()
+        for offset in range(1, size):
+            ret &= free[:, offset:offset+starts]
+        return ret
+
+    def place_piece(self, key, size, vertical, pos):
+        """
+        Place a piece on the player's board, blocking it and the spaces around it.
+        """
+        super(LayoutRandomGapArray, self).place_piece(key, size, vertical, pos)
+        end = (pos[0] + (1 if vertical else size), pos[1] + (size if vertical else 1))
+        self.occupied[pos[1]:end[1], pos[0]:end[0]] = True
+        self.blocked[max(pos[1] - 1, 0):end[1] + 1, max(pos[0] - 1, 0):end[0] + 1] = True
+
+    def remove_piece(self, size, vertical, pos):
+        """
+        Remove a piece from the player's board, unblocking the spaces no longer needed.
+        """
+        super(LayoutRandomGapArray, self).remove_piece(size, vertical, pos)
+        end = (pos[0] + (1 if vertical else size), pos[1] + (size if vertical else 1))
+        self.occupied[pos[1]:end[1], pos[0]:end[0]] = False
+        self._dilate()
+
+    def clear_board(self):
+        """
+        Remove all the pieces from the player's board.
+        """
+        super(LayoutRandomGapArray, self).clear_board()
+        self.occupied[:] = False
+        self.blocked[:] = False
+
+    def candidates(self, size):
+        """
+        Lists every orientation and position where a piece can go.
+        """
+        pos_y, pos_x = np.nonzero(self.anchors(self.blocked, size))
+        ret = [(False, (int(x), int(y))) for x, y in zip(pos_x, pos_y)]
+        if size > 1:
+            pos_x, pos_y = np.nonzero(self.anchors(self.blocked.T, size))
+            ret += [(True, (int(x), int(y))) for x, y in zip(pos_x, pos_y)]
+        return ret
+
+    def place(self, key, size):
+        """
+        Places a piece at a random valid position, picked the same way as LayoutRandomGap: an
+        orientation is chosen at random followed by a position where it would fit on the board,
+        and this is repeated until the piece can go there. Each try only checks the positions
+        the piece covers in the blocked array. Should a few tries fail, the valid positions of
+        each orientation are found with the sliding window and one is picked with the chance
+        the repeated tries would have given it, which is also how the layout knows when the
+        piece cannot go anywhere.
+        """
+        board = self.player.board
+        # Number of positions each orientation (horizontal then vertical) is picked from
+        ranges = ((max(board.width - size + 1, 0), board.height), (board.width, max(board.height - size + 1, 0)))
+        for _ in range(self.place_attempts):
+            vertical = self.player.rng.randint(0, 1) == 0
+            width, height = ranges[vertical]
+            if width < 1 or height < 1:
+                continue
+            pos = (self.player.rng.randint(0, width - 1), self.player.rng.randint(0, height - 1))
+            end = (pos[0] + (1 if vertical else size), pos[1] + (size if vertical else 1))
+            if not self.blocked[pos[1]:end[1], pos[0]:end[0]].any():
+                self.place_piece(key, size, vertical, pos)
+                return True
+
+        # Vertical positions are found by sliding the window over the transposed array
+        valid = (self.anchors(self.blocked, size), self.anchors(self.blocked.T, size))
+        counts = [int(np.count_nonzero(v)) for v in valid]
+        chances = [counts[i] / float(ranges[i][0] * ranges[i][1]) if counts[i] else 0.0 for i in range(2)]
+        if not counts[0] and not counts[1]:
+            return False
+
+        vertical = self.player.rng.random() * (chances[0] + chances[1]) >= chances[0]
+        if not counts[vertical]:
+            vertical = not vertical
+        i = int(np.flatnonzero(valid[vertical])[self.player.rng.randrange(counts[vertical])])
+        if vertical:
+            pos = divmod(i, valid[vertical].shape[1])
+        else:
+            pos = tuple(reversed(divmod(i, valid[vertical].shape[1])))
+        self.place_piece(key, size, vertical, pos)
+        return True
+
+if np is not None:
+    LayoutBase.register(LayoutRandomGapArray)
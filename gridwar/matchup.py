@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+"""
+Predicts the results of games between play strategies from one-sided samples.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from gridwar.gridwar import shots_to_kill
+
+# Version of the way samples are played, which is part of the cache key. This must be bumped
+# whenever a change to the game would change the distribution of shots (such as a change to
+# how a layout places its pieces), so out of date samples are not reused.
+CACHE_VERSION = 2
+
+class ShotsCache:
+    """
+    Samples the distribution of the number of shots a play needs to sink a fleet set-up with a
+    given layout, keeping the results on disk. The two players of a game never influence each
+    other, so the same distribution can be reused for every opponent.
+    """
+    __slots__ = ('path', 'refresh', 'sampled')
+
+    def __init__(self, path, refresh=False):
+        self.path = path
+        # Ignore (and overwrite) any samples cached before this run
+        self.refresh = refresh
+        self.sampled = set()
+        os.makedirs(path, exist_ok=True)
+
+    def filename(self, key):
+        """
+        Name of the file holding the samples for a key.
+        """
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.path, "{}_{}_{}.json".format(key["play"], key["layout"], digest[:16]))
+
+    def sample(self, width, height, pieces, layout, play, num_samples, play_params=None):
+        """
+        Returns a histogram (mapping number of shots to count) with at least the requested number
+        of samples. Previously cached samples are reused and only the shortfall is played.
+        """
+        key = {"version": CACHE_VERSION, "width": width, "height": height, "pieces": pieces, "layout": layout,
+               "play": play, "play_params": play_params}
+        filename = self.filename(key)
+        histogram = {}
+        if (not self.refresh or filename in self.sampled) and os.path.exists(filename):
+            with open(filename, 'r') as myfile:
+                cached = json.load(myfile)
+            if cached["key"] == key:
+                histogram = {int(k): v for k, v in cached["histogram"].items()}
+
+        needed = num_samples - sum(histogram.values())
+        if needed <= 0:
+            return histogram
+
+        print("Sampling {} games of play '{}' against layout '{}'".format(needed, play, layout))
+        for _ in range(needed):
+            shots = shots_to_kill(width, height, pieces, layout, play, play_params)
+            histogram[shots] = histogram.get(shots, 0) + 1
+
+        tmp_file = "{}.tmp".format(filename)
+        with open(tmp_file, 'w') as myfile:
+            json.dump({"key": key, "histogram": histogram}, myfile)
+        os.replace(tmp_file, filename)
+        self.sampled.add(filename)
+        return histogram
+
+def matchup(hist1, hist2):
+    """
+    Combines the shots distributions of two players into the probability of each winning, along
+    with the average number of rounds of the games they win. Player one shoots first so wins
+    any game where it needs no more shots than player two.
+    """
+    total1 = float(sum(hist1.values()))
+    total2 = float(sum(hist2.values()))
+    # Probability of each player needing at least (p1) or more than (p2) a given number of shots
+    longest = max(max(hist1), max(hist2))
+    at_least2 = [0.0] * (longest + 2)
+    more_than1 = [0.0] * (longest + 2)
+    for shots in range(longest, -1, -1):
+        at_least2[shots] = at_least2[shots + 1] + hist2.get(shots, 0) / total2
+        more_than1[shots] = more_than1[shots + 1] + hist1.get(shots + 1, 0) / total1
+
+    wins = [0.0, 0.0]
+    rounds = [0.0, 0.0]
+    for shots, count in hist1.items():
+        prob = count / total1 * at_least2[shots]
+        wins[0] += prob
+        rounds[0] += prob * shots
+    for shots, count in hist2.items():
+        prob = count / total2 * more_than1[shots]
+        wins[1] += prob
+        rounds[1] += prob * shots
+
+    return wins, [rounds[i] / wins[i] if wins[i] else 0 for i in range(2)]
+
+class Tournament:
+    """
+    Predicts the results of every pairing of a set of plays. Each play only needs its shots
+    distribution sampled against each layout in use, rather than simulating every pairing.
+    """
+    __slots__ = ('size', 'pieces', 'layouts', 'plays', 'num_samples', 'cache')
+
+    def __init__(self, width, height, pieces, p1_layout, p2_layout, plays, num_samples, cache):
+        self.size = (width, height)
+        self.pieces = pieces
+        self.layouts = (p1_layout, p2_layout)
+        self.plays = plays
+        self.num_samples = num_samples
+        self.cache = cache
+
+    def histogram(self, play, layout):
+        """
+        Retrieve the shots distribution of a play against a layout.
+        """
+        return self.cache.sample(self.size[0], self.size[1], self.pieces, layout, play, self.num_samples)
+
+    def run(self):
+        """
+        Print the predicted win rate of player one for each pairing of plays.
+        """
+        start_time = time.time()
+        # Player one attacks player two's layout and vice versa
+        attacking_p2 = {play: self.histogram(play, self.layouts[1]) for play in self.plays}
+        attacking_p1 = {play: self.histogram(play, self.layouts[0]) for play in self.plays}
+
+        width = max(len(play) for play in self.plays)
+        print("Predicted win rate of player 1 (rows) against player 2 (columns):")
+        print(" " * width + "".join(" {:>6}".format(i+1) for i in range(len(self.plays))))
+        for i, play in enumerate(self.plays):
+            row = [matchup(attacking_p2[play], attacking_p1[opponent])[0][0] for opponent in self.plays]
+            print("{:>{}}".format(play, width) + "".join(" {:6.3f}".format(rate) for rate in row) +
+                  "  ({})".format(i+1))
+        print("Tournament took: {:.2f} seconds to execute".format(time.time() - start_time))
@@ -5,6 +5,7 @@ Manages code for a player.
 """
 
 import copy
+import random
 from gridwar.layouts import LayoutBase
 from gridwar.plays import PlayBase
 from gridwar.board import Board
@@ -14,22 +15,28 @@ class Player:
     """
     Defines the state of a player's board.
     """
-    __slots__ = ('name', 'board', 'tracking_board', 'pieces', 'opponent_pieces', 'layout', 'play', 'verbose')
+    __slots__ = ('name', 'board', 'tracking_board', 'pieces', 'opponent_pieces', 'layout', 'play', 'verbose',
+                 'rng')
 
-    def __init__(self, name, width, height, pieces, layout, play, verbose):
+    def __init__(self, name, width, height, pieces, layout, play, verbose, play_params=None, rng=None):
         self.name = name
         self.board = Board(width, height)
         self.tracking_board = Board(width, height)
         self.pieces = copy.deepcopy(pieces)
         self.opponent_pieces = copy.deepcopy(pieces)
-        self.layout = LayoutBase.get_class(layout)(self)
-        self.play = PlayBase.get_class(play)(self)
         self.verbose = verbose
-
-        for k, p in pieces.items():
-            if self.layout.place(k, p) is not True:
-                raise GameError("Failed to place piece ('{}': {}) using layout '{}' on board:\n{}".
-                                format(k, p, self.layout, self.board))
+        # All random choices made by the player's layout and play come from this generator. The
+        # layout is set-up before the play so the board only depends on the generator's state.
+        self.rng = rng if rng is not None else random
+        # A player that only attacks (or is only attacked) can go without a layout (or play)
+        self.layout = None
+        if layout is not None:
+            self.layout = LayoutBase.get_class(layout)(self)
+            self.layout.place_fleet(pieces)
+
+        self.play = None
+        if play is not None:
+            self.play = PlayBase.get_class(play)(self, play_params)
 
         if self.verbose: print(self)
 
@@ -71,6 +78,23 @@ class Player:
             for pos_x in range(pos[0], pos[0]+size):
                 self.board.set((pos_x, pos[1]), key)
 
+    def remove_piece(self, size, vertical, pos):
+        """
+        Remove a piece from a specific location.
+        """
+        if vertical is True:
+            for pos_y in range(pos[1], pos[1]+size):
+                self.board.set((pos[0], pos_y), Board.EMPTY)
+        else:
+            for pos_x in range(pos[0], pos[0]+size):
+                self.board.set((pos_x, pos[1]), Board.EMPTY)
+
+    def clear_board(self):
+        """
+        Remove all the pieces from the board.
+        """
+        self.board = Board(self.board.width, self.board.height)
+
     def get_next_attack(self):
         """
         Get player's next move.
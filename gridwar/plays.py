@@ -4,9 +4,16 @@
 Manages the different play styles that a player can be set to.
 """
 
-import random
+import itertools
+import json
+import os
 from gridwar.utils import GameError
 from gridwar.board import Board
+from gridwar.solver import HIT, MISS, policy_filename
+
+# Orders in which homing tries each direction from a hit (Right, Left, Down and Up). The
+# first one is the original order of both horizontals followed by both verticals.
+HOMING_ORDERS = tuple(''.join(order) for order in itertools.permutations("RLDU"))
 
 class PlayBase:
     """
@@ -29,6 +36,13 @@ class PlayBase:
         for i, c in enumerate(cls._plays):
             print("{} - '{}' ({})".format(i+1, c.__name__, c.desc()))
 
+    @classmethod
+    def play_names(cls):
+        """
+        Names of the registered plays.
+        """
+        return [c.__name__ for c in cls._plays]
+
     @classmethod
     def is_valid(cls, play_name):
         """
@@ -51,12 +65,40 @@ class PlayBase:
                 return c
         return None
 
-    def __init__(self, player):
+    # Parameters that can be tuned for a play. Maps each parameter name to the tuple of values
+    # it can take, the first of which is the default.
+    param_space = {}
+
+    def __init__(self, player, params=None):
         self.player = player
+        space = self.param_space_for(player.opponent_pieces)
+        self.params = {k: v[0] for k, v in space.items()}
+        if params:
+            for k, v in params.items():
+                if k not in space:
+                    raise GameError("Play '{}' does not have a parameter named '{}'".format(self, k))
+                if v not in space[k]:
+                    raise GameError("Play '{}' parameter '{}' cannot be set to '{}' (valid values are {})".
+                                    format(self, k, v, space[k]))
+                self.params[k] = v
 
     def __str__(self):
         return self.__class__.__name__
 
+    @classmethod
+    def param_space_for(cls, pieces):
+        """
+        Parameter space of the play when attacking a set of pieces.
+        """
+        return cls.param_space
+
+    @classmethod
+    def available(cls, width, height, pieces):
+        """
+        Checks if the play can be used for a board size and set of pieces.
+        """
+        return True
+
     def play(self):
         """
         Makes a move.
@@ -73,10 +115,10 @@ class PlayRandom(PlayBase):
     """
     Randomly attack the board.
     """
-    def __init__(self, player):
-        super(PlayRandom, self).__init__(player)
+    def __init__(self, player, params=None):
+        super(PlayRandom, self).__init__(player, params)
         self.plays = [(x, y) for x in range(player.board.width) for y in range(player.board.height)]
-        random.shuffle(self.plays)
+        self.player.rng.shuffle(self.plays)
 
     @classmethod
     def desc(cls):
@@ -103,8 +145,8 @@ class PlayScan(PlayBase):
     """
     Play by scaning the board from left to right, top to bottom.
     """
-    def __init__(self, player):
-        super(PlayScan, self).__init__(player)
+    def __init__(self, player, params=None):
+        super(PlayScan, self).__init__(player, params)
         self.plays = [(x, y) for x in range(player.board.width) for y in range(player.board.height)]
 
     @classmethod
@@ -132,8 +174,10 @@ class PlayScanAndHomeIn(PlayScan):
     """
     Play by scanning the board but homing in on a successful hit.
     """
-    def __init__(self, player):
-        super(PlayScanAndHomeIn, self).__init__(player)
+    param_space = {"homing_order": HOMING_ORDERS}
+
+    def __init__(self, player, params=None):
+        super(PlayScanAndHomeIn, self).__init__(player, params)
         self.homing = None
 
     @classmethod
@@ -167,7 +211,7 @@ class PlayScanAndHomeIn(PlayScan):
             if sunk:
                 self.homing = None
             elif not self.homing:
-                self.homing = HomeIn(attack_pos, self.player)
+                self.homing = HomeIn(attack_pos, self.player, self.params["homing_order"])
 
         elif self.homing is not None:
             self.homing.result(attack_pos, is_hit, sunk)
@@ -178,8 +222,15 @@ class PlaySkipScanAndHomeIn(PlayScan):
     """
     Play by scanning at just enough to hit the smallest remaining ship.
     """
-    def __init__(self, player):
-        super(PlaySkipScanAndHomeIn, self).__init__(player)
+    # The scan parity offsets the pattern of scanned cells, while the skipped order sets how
+    # the cells skipped by the scan are played once the scan has been used up. The offsets
+    # available depend on the smallest piece so are filled in by param_space_for().
+    param_space = {"homing_order": HOMING_ORDERS,
+                   "scan_parity": (0,),
+                   "skipped_order": ("random", "scan", "reverse")}
+
+    def __init__(self, player, params=None):
+        super(PlaySkipScanAndHomeIn, self).__init__(player, params)
         self.homing = None
         self.skipped_plays = list()
         self._regenerate_scan()
@@ -191,6 +242,16 @@ class PlaySkipScanAndHomeIn(PlayScan):
         """
         return "Scans in a pattern that will find the smallest remaining ship and then homes in"
 
+    @classmethod
+    def param_space_for(cls, pieces):
+        """
+        Parameter space of the play when attacking a set of pieces. Each offset below the size
+        of the smallest piece gives a different scan, with larger ones repeating them.
+        """
+        space = dict(cls.param_space)
+        space["scan_parity"] = tuple(range(min(pieces.values())))
+        return space
+
     def play(self):
         """
         Makes a move.
@@ -209,7 +270,10 @@ class PlaySkipScanAndHomeIn(PlayScan):
 
         if len(self.plays) == 0:
             # When original plays have been used up, return one of the discarded ones
-            random.shuffle(self.skipped_plays)
+            if self.params["skipped_order"] == "reverse":
+                return self.skipped_plays.pop()
+            if self.params["skipped_order"] == "random":
+                self.player.rng.shuffle(self.skipped_plays)
             return self.skipped_plays.pop(0)
         
         return self.plays.pop(0)
@@ -220,11 +284,14 @@ class PlaySkipScanAndHomeIn(PlayScan):
         combining the remaining plays (and skipped plays) and resplitting them based
         on the new stepping.
         """
+        # The parity is below the smallest piece at the start, so it stays a valid offset as
+        # pieces are sunk and the smallest remaining ship grows
         smallest_ship = min(self.player.opponent_pieces.values())
+        parity = self.params["scan_parity"]
         new_plays = list()
         new_skipped_plays = list()
         for play in [*self.plays, *self.skipped_plays]:
-            if sum(play) % smallest_ship == 0:
+            if sum(play) % smallest_ship == parity:
                 new_plays.append(play)
             else:
                 new_skipped_plays.append(play)
@@ -239,7 +306,7 @@ class PlaySkipScanAndHomeIn(PlayScan):
             if sunk:
                 self.homing = None
             elif not self.homing:
-                self.homing = HomeIn(attack_pos, self.player)
+                self.homing = HomeIn(attack_pos, self.player, self.params["homing_order"])
 
         elif self.homing is not None:
             self.homing.result(attack_pos, is_hit, sunk)
@@ -250,8 +317,10 @@ class PlayRandomAndHomeIn(PlayRandom):
     """
     Play randomly but home in on a successful hit.
     """
-    def __init__(self, player):
-        super(PlayRandomAndHomeIn, self).__init__(player)
+    param_space = {"homing_order": HOMING_ORDERS}
+
+    def __init__(self, player, params=None):
+        super(PlayRandomAndHomeIn, self).__init__(player, params)
         self.homing = None
 
     @classmethod
@@ -285,64 +354,102 @@ class PlayRandomAndHomeIn(PlayRandom):
             if sunk:
                 self.homing = None
             elif not self.homing:
-                self.homing = HomeIn(attack_pos, self.player)
+                self.homing = HomeIn(attack_pos, self.player, self.params["homing_order"])
 
         elif self.homing is not None:
             self.homing.result(attack_pos, is_hit, sunk)
 
 PlayBase.register(PlayRandomAndHomeIn)
 
+class PlaySolved(PlayBase):
+    """
+    Play the shots worked out beforehand by the solver, which are the best possible unless the
+    search was restricted (see Solver). Each move is just a look up into the solved policy.
+    """
+    # Policies that have been read in, by filename
+    _policies = {}
+    # Directory the policies are read from
+    policy_dir = "."
+
+    def __init__(self, player, params=None):
+        super(PlaySolved, self).__init__(player, params)
+        filename = policy_filename(player.board.width, player.board.height, player.opponent_pieces,
+                                   PlaySolved.policy_dir)
+        if filename not in PlaySolved._policies:
+            if not os.path.exists(filename):
+                raise GameError("Play '{}' needs the policy '{}' (created by running with --solve)".
+                                format(self, filename))
+            with open(filename, 'r') as myfile:
+                policy = json.load(myfile)
+            if policy["pieces"] != player.opponent_pieces:
+                raise GameError("Policy '{}' was solved for pieces {} not {}".
+                                format(filename, policy["pieces"], player.opponent_pieces))
+            PlaySolved._policies[filename] = [(tuple(pos), results) for pos, results in policy["nodes"]]
+        self.nodes = PlaySolved._policies[filename]
+        self.node = 0
+
+    @classmethod
+    def desc(cls):
+        """
+        String description of this play.
+        """
+        return ("Plays the shots the solver found to be best (needs a solved policy; one solved with hunt_cells "
+                "only gives an upper bound on the best play)")
+
+    @classmethod
+    def available(cls, width, height, pieces):
+        """
+        Checks if a policy has been solved for the board size and set of pieces.
+        """
+        return os.path.exists(policy_filename(width, height, pieces, cls.policy_dir))
+
+    def play(self):
+        """
+        Makes a move.
+        """
+        if self.node is None:
+            raise GameError("Play '{}' has no more moves in its policy".format(self))
+        return self.nodes[self.node][0]
+
+    def result(self, attack_pos, is_hit, sunk):
+        """
+        Update state base on result of play.
+        """
+        if sunk is not None:
+            label = sunk
+        else:
+            label = HIT if is_hit else MISS
+        # There is no move after the last piece is sunk
+        self.node = self.nodes[self.node][1].get(label)
+
+PlayBase.register(PlaySolved)
+
 class HomeIn:
     """
     Define a class for managing homing in strategy used by plays.
     """
-    def __init__(self, init_hit, player):
+    # Step taken across the board for each homing direction
+    directions = {"R": (1, 0), "L": (-1, 0), "D": (0, 1), "U": (0, -1)}
+
+    def __init__(self, init_hit, player, order="RLDU"):
         self.init_hit = init_hit
         self.player = player
 
-        # Set up attempts. Do both horizontals first, followed by both verticals
+        # Set up attempts. By default do both horizontals first, followed by both verticals
         self.attempts = []
-        sx, sy = init_hit
-        tries = []
-        for x in range(sx + 1, self.player.board.width, 1):
-            pos = (x, sy)
-            hit = player.tracking_board.get(pos)
-            if hit == Board.EMPTY:
-                tries.append(pos)
-            elif hit == Board.MISS:
-                break
-        if len(tries) > 0:
-            self.attempts.append(tries)
-        tries = []
-        for x in range(sx - 1, -1, -1):
-            pos = (x, sy)
-            hit = player.tracking_board.get(pos)
-            if hit == Board.EMPTY:
-                tries.append(pos)
-            elif hit == Board.MISS:
-                break
-        if len(tries) > 0:
-            self.attempts.append(tries)
-        tries = []
-        for y in range(sy + 1, self.player.board.height, 1):
-            pos = (sx, y)
-            hit = player.tracking_board.get(pos)
-            if hit == Board.EMPTY:
-                tries.append(pos)
-            elif hit == Board.MISS:
-                break
-        if len(tries) > 0:
-            self.attempts.append(tries)
-        tries = []
-        for y in range(sy - 1, -1, -1):
-            pos = (sx, y)
-            hit = player.tracking_board.get(pos)
-            if hit == Board.EMPTY:
-                tries.append(pos)
-            elif hit == Board.MISS:
-                break
-        if len(tries) > 0:
-            self.attempts.append(tries)
+        for direction in order:
+            step_x, step_y = HomeIn.directions[direction]
+            tries = []
+            pos = (init_hit[0] + step_x, init_hit[1] + step_y)
+            while 0 <= pos[0] < self.player.board.width and 0 <= pos[1] < self.player.board.height:
+                hit = player.tracking_board.get(pos)
+                if hit == Board.EMPTY:
+                    tries.append(pos)
+                elif hit == Board.MISS:
+                    break
+                pos = (pos[0] + step_x, pos[1] + step_y)
+            if len(tries) > 0:
+                self.attempts.append(tries)
 
     def play(self):
         """
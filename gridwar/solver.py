@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+
+"""
+Solves small games exactly, finding the play that needs the fewest shots on average.
+"""
+
+import collections
+import json
+import os
+import time
+
+from gridwar.utils import GameError
+
+# Labels for the result of a shot in the policy (a sunk piece is labelled with its key)
+MISS = "miss"
+HIT = "hit"
+
+def policy_filename(width, height, pieces, directory="."):
+    """
+    Name of the file a solved policy is written to (in the given directory) for a board size
+    and set of pieces.
+    """
+    return os.path.join(directory, "policy_{}x{}_{}.json".
+                        format(width, height, "-".join(str(p) for p in pieces.values())))
+
+class TranspositionTable:
+    """
+    Remembers the value of searched states. When full, the least recently used entry is
+    evicted so the memory used stays bounded.
+    """
+    __slots__ = ('max_entries', 'entries', 'hits', 'evictions')
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Retrieve an entry, or None if the state has not been stored.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """
+        Store an entry, evicting the least recently used one if the table is full.
+        """
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+class Solver:
+    """
+    Finds the play minimising the expected number of shots needed to sink every piece, when
+    the pieces are laid out uniformly at random over all arrangements that do not overlap
+    (which is what LayoutRandom aims for).
+
+    The belief about where the pieces are is held as a bit mask over every arrangement, along
+    with the hits and the cell each piece was sunk at. Each belief reached is stored in the
+    transposition table with its expected number of shots and best shot, keyed on the state
+    reduced by the symmetries of the board. Lower bounds on the states a shot leads to are
+    used to skip shots that cannot beat the best one found so far.
+
+    When the state is symmetric only one cell of each set of cells the symmetries map onto
+    each other is tried, and pieces of the same size are treated as interchangeable, both of
+    which keep the search exact. Unless target_adjacent is turned off, a piece that has been
+    hit but not sunk is also always targeted by shooting next to a hit. This is what any
+    sensible play does and makes the search quicker, but means the result is the best play
+    that homes in like this rather than the best of all plays (on every board checked, up to
+    5x3 with two pieces and 4x3 with three, the two are the same).
+
+    By default every cell is tried, which is practical up to a 4x4 board with two or three
+    pieces (two pieces of size 2 take about 12 seconds, three about 75) or a 5x4 board with
+    two pieces (about 5 minutes). A 5x5 board is out of reach. Setting hunt_cells makes larger
+    boards possible by only trying the hunt_cells cells most likely to be hit while hunting
+    for a piece (no piece has been hit but not sunk), so the result is then only an upper
+    bound on the best possible. On a 4x3 board with two pieces of size 2 the best possible
+    play needs 7.304 shots on average, while trying two cells finds one needing 7.314 and
+    trying one cell 7.333. Trying one cell solves a 5x5 board with two pieces in about a
+    second and with three pieces in one to two minutes, and a 6x6 board with two pieces in
+    about a second and with three pieces of size 2 in about 13 minutes.
+    """
+    __slots__ = ('size', 'pieces', 'keys', 'sizes', 'total', 'num_cells', 'arrangements', 'cover', 'placed',
+                 'placements', 'placements_at', 'alike', 'others', 'covering', 'search_misses', 'neighbours', 'symmetries',
+                 'table', 'nodes', 'deadline', 'time_limit', 'target_adjacent', 'hunt_cells')
+
+    def __init__(self, width, height, pieces, max_entries=1000000, time_limit=None, target_adjacent=True,
+                 hunt_cells=None):
+        self.size = (width, height)
+        self.pieces = pieces
+        self.keys = list(pieces)
+        self.sizes = [pieces[key] for key in self.keys]
+        # Pieces sharing a size, which are interchangeable apart from their labels
+        self.alike = [group for group in ([k for k, s in enumerate(self.sizes) if s == size]
+                                          for size in sorted(set(self.sizes))) if len(group) > 1]
+        self.total = sum(pieces.values())
+        self.num_cells = width * height
+        self.table = TranspositionTable(max_entries)
+        self.nodes = 0
+        self.time_limit = time_limit
+        self.deadline = None
+        self.target_adjacent = target_adjacent
+        self.hunt_cells = hunt_cells
+
+        # Every placement of each piece as a mask of the cells it covers
+        self.placements = []
+        for key in self.keys:
+            size = pieces[key]
+            masks = set()
+            for y in range(height):
+                for x in range(width - size + 1):
+                    masks.add(sum(1 << self.cell((x + i, y)) for i in range(size)))
+            for y in range(height - size + 1):
+                for x in range(width):
+                    masks.add(sum(1 << self.cell((x, y + i)) for i in range(size)))
+            self.placements.append(sorted(masks))
+
+        # Every arrangement of all the pieces that do not overlap
+        self.arrangements = []
+        def arrange(index, used, chosen):
+            if index == len(self.keys):
+                self.arrangements.append(tuple(chosen))
+                return
+            for mask in self.placements[index]:
+                if not mask & used:
+                    arrange(index + 1, used | mask, chosen + [mask])
+        arrange(0, 0, [])
+        if not self.arrangements:
+            raise GameError("Pieces {} do not fit on a {}x{} board".format(pieces, width, height))
+
+        # Arrangements (as masks over the arrangements) covering each cell and with each piece at
+        # each of its placements
+        self.cover = [0] * self.num_cells
+        self.placed = [dict() for _ in self.keys]
+        for i, arrangement in enumerate(self.arrangements):
+            bit = 1 << i
+            for k, mask in enumerate(arrangement):
+                self.placed[k][mask] = self.placed[k].get(mask, 0) | bit
+                for cell in self.cells(mask):
+                    self.cover[cell] |= bit
+
+        # Placements of each piece covering each cell
+        self.placements_at = [[[] for _ in range(self.num_cells)] for _ in self.keys]
+        for k, placements in enumerate(self.placements):
+            for mask in placements:
+                for cell in self.cells(mask):
+                    self.placements_at[k][cell].append(mask)
+
+        # For each piece, the arrangements grouped by where the other pieces are, the arrangements
+        # with the piece covering each cell and the expected number of misses searching for it
+        # (see piece_bound())
+        self.others = []
+        self.covering = []
+        self.search_misses = []
+        for k, placements in enumerate(self.placements):
+            groups = {}
+            for i, arrangement in enumerate(self.arrangements):
+                rest = arrangement[:k] + arrangement[k+1:]
+                groups[rest] = groups.get(rest, 0) | (1 << i)
+            self.others.append(list(groups.values()))
+            covering = []
+            for cell in range(self.num_cells):
+                mask = 0
+                for placement in self.placements_at[k][cell]:
+                    mask |= self.placed[k].get(placement, 0)
+                covering.append(mask)
+            self.covering.append(covering)
+            most = max(len(at) for at in self.placements_at[k])
+            self.search_misses.append([sum(1.0 - float(most * shot) / num for shot in range(1, num // most + 1))
+                                       if num else 0.0 for num in range(len(placements) + 1)])
+
+        # Cells next to each cell (as a mask)
+        self.neighbours = []
+        for cell in range(self.num_cells):
+            x, y = self.pos(cell)
+            self.neighbours.append(sum(1 << self.cell((x + step_x, y + step_y))
+                                       for step_x, step_y in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                                       if 0 <= x + step_x < width and 0 <= y + step_y < height))
+
+        # Symmetries of the board as permutations of the cells
+        transforms = [lambda x, y: (x, y), lambda x, y: (width - 1 - x, y),
+                      lambda x, y: (x, height - 1 - y), lambda x, y: (width - 1 - x, height - 1 - y)]
+        if width == height:
+            transforms += [lambda x, y: (y, x), lambda x, y: (width - 1 - y, x),
+                           lambda x, y: (y, width - 1 - x), lambda x, y: (width - 1 - y, width - 1 - x)]
+        self.symmetries = []
+        for transform in transforms:
+            perm = [self.cell(transform(*self.pos(cell))) for cell in range(self.num_cells)]
+            inverse = [0] * self.num_cells
+            for cell, image in enumerate(perm):
+                inverse[image] = cell
+            # Permuting masks a byte at a time is much quicker than a cell at a time
+            tables = []
+            for shift in range(0, self.num_cells, 8):
+                tables.append([sum(1 << perm[shift + bit] for bit in range(8)
+                                   if value & (1 << bit) and shift + bit < self.num_cells)
+                               for value in range(256)])
+            self.symmetries.append((perm, inverse, tables))
+
+    def cell(self, pos):
+        """
+        Index of the cell at a position.
+        """
+        return pos[0] + pos[1] * self.size[0]
+
+    def pos(self, cell):
+        """
+        Position of a cell.
+        """
+        return (cell % self.size[0], cell // self.size[0])
+
+    @staticmethod
+    def cells(mask):
+        """
+        Indices of the cells set in a mask.
+        """
+        ret = []
+        while mask:
+            low = mask & -mask
+            ret.append(low.bit_length() - 1)
+            mask ^= low
+        return ret
+
+    @staticmethod
+    def permute(mask, tables):
+        """
+        Apply a permutation of the cells (given as lookup tables for each byte) to a mask.
+        """
+        ret = 0
+        for table in tables:
+            ret |= table[mask & 0xff]
+            mask >>= 8
+        return ret
+
+    def canonical(self, hits, dead, places):
+        """
+        Returns the smallest key for a state over all the symmetries of the board, along with
+        the symmetry used and the symmetries that leave the state as it is.
+        """
+        # The first symmetry is the identity, so gives the state's own key
+        state = (hits, dead, self.relabel(tuple(p if p is None else tuple(sorted(p)) for p in places)))
+        best = (state, self.symmetries[0])
+        stabiliser = [self.symmetries[0]]
+        for symmetry in self.symmetries[1:]:
+            tables = symmetry[2]
+            cells = (self.permute(hits, tables), self.permute(dead, tables))
+            # Where the sunk pieces could be is only needed to break a tie or to check whether
+            # the symmetry leaves the state as it is
+            if cells > best[0][:2] and cells != state[:2]:
+                continue
+            key = cells + (self.relabel(tuple(p if p is None else tuple(sorted(self.permute(mask, tables) for mask in p))
+                                              for p in places)),)
+            if key == state:
+                stabiliser.append(symmetry)
+            if key < best[0]:
+                best = (key, symmetry)
+        return best[0], best[1], stabiliser
+
+    def relabel(self, places):
+        """
+        Returns where the sunk pieces could be with the pieces of each size in a set order.
+        Pieces of the same size can swap labels without changing how the game plays out.
+        """
+        if not self.alike:
+            return places
+        places = list(places)
+        for group in self.alike:
+            for k, place in zip(group, sorted((places[k] for k in group), key=lambda p: (p is not None, p or ()))):
+                places[k] = place
+        return tuple(places)
+
+    def state_key(self, hits, sunk, belief, counts):
+        """
+        Returns the transposition table key for a state (before reducing it by symmetry). The
+        key describes the belief rather than how it was reached: the hits, the cells that can no
+        longer hold a piece and where each sunk piece could be. A sunk piece whose position is
+        known is treated as empty cells, as it makes no difference to the rest of the game.
+        """
+        dead = 0
+        for cell, count in enumerate(counts):
+            if count == 0:
+                dead |= 1 << cell
+        places = []
+        for k, cell in enumerate(sunk):
+            if cell is None:
+                places.append(None)
+                continue
+            masks = [mask for mask in self.placements_at[k][cell]
+                     if mask & hits == mask and belief & self.placed[k][mask]]
+            if len(masks) == 1:
+                hits &= ~masks[0]
+                dead |= masks[0]
+                masks = []
+            places.append(tuple(masks))
+        return (hits, dead, tuple(places))
+
+    def outcomes(self, belief, hits, sunk, cell):
+        """
+        Splits the belief by the possible results of a shot at a cell. Returns a list of the
+        result label, the belief afterwards and the number of arrangements giving that result.
+        """
+        ret = []
+        bit = 1 << cell
+        hit_belief = belief & self.cover[cell]
+        miss_belief = belief ^ hit_belief
+        if miss_belief:
+            ret.append((MISS, miss_belief, miss_belief.bit_count()))
+        new_hits = hits | bit
+        for k, key in enumerate(self.keys):
+            if sunk[k] is not None:
+                continue
+            # Piece k is sunk by this shot when it covers the cell and all its other cells are hit
+            sink_belief = 0
+            for mask in self.placements_at[k][cell]:
+                if mask & new_hits == mask:
+                    sink_belief |= self.placed[k][mask]
+            sink_belief &= hit_belief
+            if sink_belief:
+                hit_belief ^= sink_belief
+                ret.append((key, sink_belief, sink_belief.bit_count()))
+        if hit_belief:
+            ret.append((HIT, hit_belief, hit_belief.bit_count()))
+        return ret
+
+    def after(self, hits, sunk, cell, label):
+        """
+        Returns the hits and the cells where each piece was sunk after a shot at a cell with the
+        given result.
+        """
+        if label == MISS:
+            return hits, sunk
+        hits |= 1 << cell
+        if label != HIT:
+            k = self.keys.index(label)
+            sunk = sunk[:k] + (cell,) + sunk[k+1:]
+        return hits, sunk
+
+    def counts(self, belief):
+        """
+        Number of arrangements in the belief covering each cell.
+        """
+        return [(belief & cover).bit_count() for cover in self.cover]
+
+    def lower_bound(self, hits, counts, count):
+        """
+        Returns a lower bound on the expected number of shots still needed. Every piece cell not
+        yet hit needs a shot, and the shots before the next hit are misses. Until then the shots
+        are in a fixed order, so the chance of the first k all missing is at least one minus the
+        sum of the k largest chances of a hit.
+        """
+        num_hits = hits.bit_count()
+        bound = float(self.total - num_hits)
+        # Cells certain to hold a piece are either hits or could be shot next for a sure hit
+        if counts.count(count) > num_hits:
+            return bound
+        remaining = count
+        for likely in sorted((c for c in counts if c < count), reverse=True):
+            remaining -= likely
+            if remaining <= 0:
+                break
+            bound += float(remaining) / count
+        return bound
+
+    def piece_bound(self, hits, belief, count):
+        """
+        Returns a lower bound on the expected number of misses still to come, which is slower to
+        work out than the one in lower_bound() but can be much closer. Even when told where all
+        the other pieces are, a play still has to search for a piece that has not been hit yet.
+        Each shot covers at most so many of the places it could be, so the chance of the first
+        k shots all missing it is at least one minus k times that many over the places left.
+        """
+        hit_cells = self.cells(hits)
+        bound = 0.0
+        for k, groups in enumerate(self.others):
+            touched = 0
+            for cell in hit_cells:
+                touched |= self.covering[k][cell]
+            if belief & touched:
+                continue
+            misses = self.search_misses[k]
+            total = 0.0
+            for group in groups:
+                num = (belief & group).bit_count()
+                total += num * misses[num]
+            bound = max(bound, total / count)
+        return bound
+
+    def search(self, hits, sunk, belief, counts=None):
+        """
+        Returns the expected number of shots still needed from a state when playing the best
+        shots, storing it in the transposition table along with the best shot.
+        """
+        num_hits = hits.bit_count()
+        if num_hits == self.total:
+            return 0.0
+
+        if counts is None:
+            counts = self.counts(belief)
+        key, symmetry, stabiliser = self.canonical(*self.state_key(hits, sunk, belief, counts))
+        entry = self.table.get(key)
+        if entry is not None:
+            return entry[0]
+
+        self.nodes += 1
+        if self.deadline is not None and (self.nodes & 0x3ff) == 0 and time.time() > self.deadline:
+            raise GameError("Solver gave up after {} seconds ({} states searched)".format(self.time_limit, self.nodes))
+
+        count = belief.bit_count()
+        cells = self.shots(hits, sunk, counts, stabiliser)
+
+        if count == 1:
+            # The arrangement is known, so just shoot its remaining cells
+            best, best_cell = float(self.total - num_hits), cells[0]
+        else:
+            best, best_cell = float("inf"), None
+            for cell in cells:
+                states = []
+                estimate = 1.0
+                for label, new_belief, num in self.outcomes(belief, hits, sunk, cell):
+                    new_hits, new_sunk = self.after(hits, sunk, cell, label)
+                    prob = float(num) / count
+                    lower, new_counts = 0.0, None
+                    if new_hits.bit_count() < self.total:
+                        new_counts = self.counts(new_belief)
+                        lower = self.lower_bound(new_hits, new_counts, num)
+                    states.append([prob, lower, new_hits, new_sunk, new_belief, new_counts, num])
+                    estimate += prob * lower
+                # If the shot could beat the best one found, try tightening the bounds first
+                if estimate < best < float("inf"):
+                    for state in states:
+                        if state[5] is not None:
+                            lower = self.total - state[2].bit_count() + self.piece_bound(state[2], state[4], state[6])
+                            if lower > state[1]:
+                                estimate += state[0] * (lower - state[1])
+                                state[1] = lower
+                # Skip the shot if it cannot beat the best one found, otherwise replace each
+                # result's lower bound with its value until it is clear either way
+                for prob, lower, new_hits, new_sunk, new_belief, new_counts, _ in states:
+                    if estimate >= best:
+                        break
+                    estimate += prob * (self.search(new_hits, new_sunk, new_belief, new_counts) - lower)
+                if estimate < best:
+                    best, best_cell = estimate, cell
+
+        # The best cell is stored as it is in the canonical state
+        self.table.put(key, (best, symmetry[0][best_cell]))
+        return best
+
+    def shots(self, hits, sunk, counts, stabiliser):
+        """
+        Returns the cells worth trying to shoot in a state, most likely to hit first so good
+        plays are found early.
+        """
+        cells = [cell for cell in range(self.num_cells) if counts[cell] and not hits & (1 << cell)]
+
+        # There are more hits than the sunk pieces cover, so a piece has been hit but not sunk
+        targeting = hits.bit_count() > sum(self.sizes[k] for k, cell in enumerate(sunk) if cell is not None)
+        if targeting and self.target_adjacent:
+            near = 0
+            for cell in self.cells(hits):
+                near |= self.neighbours[cell]
+            cells = [cell for cell in cells if near & (1 << cell)]
+
+        # Cells mapped onto each other by a symmetry of the state are as good as each other
+        if len(stabiliser) > 1:
+            allowed = set(cells)
+            cells = [cell for cell in cells
+                     if all(symmetry[0][cell] >= cell or symmetry[0][cell] not in allowed for symmetry in stabiliser)]
+        cells.sort(key=lambda cell: -counts[cell])
+        if not targeting and self.hunt_cells is not None:
+            cells = cells[:self.hunt_cells]
+        return cells
+
+    def best_cell(self, hits, sunk, belief):
+        """
+        Returns the best cell to shoot in a state along with the expected number of shots.
+        """
+        value = self.search(hits, sunk, belief)
+        key, symmetry, _ = self.canonical(*self.state_key(hits, sunk, belief, self.counts(belief)))
+        entry = self.table.get(key)
+        if entry is None:
+            # The entry has been evicted so search the state again
+            value = self.search(hits, sunk, belief)
+            entry = self.table.get(key)
+        return symmetry[1][entry[1]], value
+
+    def solve(self):
+        """
+        Solves the game, returning the expected number of shots along with the policy. The
+        policy is a list of nodes, each holding the position to shoot and the index of the node
+        to go to for each result of the shot (the first node is the start of the game).
+        """
+        start_time = time.time()
+        if self.time_limit is not None:
+            self.deadline = start_time + self.time_limit
+
+        nodes = []
+        value = None
+        queue = collections.deque([(0, (None,) * len(self.keys), (1 << len(self.arrangements)) - 1, None, None)])
+        while queue:
+            hits, sunk, belief, parent, label = queue.popleft()
+            cell, expected = self.best_cell(hits, sunk, belief)
+            if value is None:
+                value = expected
+            index = len(nodes)
+            nodes.append([self.pos(cell), {}])
+            if parent is not None:
+                nodes[parent][1][label] = index
+            for result, new_belief, _ in self.outcomes(belief, hits, sunk, cell):
+                new_hits, new_sunk = self.after(hits, sunk, cell, result)
+                if new_hits.bit_count() < self.total:
+                    queue.append((new_hits, new_sunk, new_belief, index, result))
+
+        print("Solved {}x{} board with pieces {} over {} arrangements in {:.2f} seconds".
+              format(self.size[0], self.size[1], self.pieces, len(self.arrangements), time.time() - start_time))
+        print("Searched {} states ({} table hits, {} evictions), policy has {} positions".
+              format(self.nodes, self.table.hits, self.table.evictions, len(nodes)))
+        return value, nodes
+
+    def search_kind(self):
+        """
+        Describes how far the search was restricted: "exact" finds the best of all plays,
+        "homing" the best play that always shoots next to a piece hit but not sunk, and
+        "restricted" (when hunt_cells is set) only gives an upper bound on the best possible.
+        """
+        if self.hunt_cells is not None:
+            return "restricted"
+        return "homing" if self.target_adjacent else "exact"
+
+    def save(self, filename, value, nodes):
+        """
+        Write a solved policy out so it can be used by PlaySolved.
+        """
+        with open(filename, 'w') as myfile:
+            json.dump({"width": self.size[0], "height": self.size[1], "pieces": self.pieces,
+                       "expected_shots": value, "search": self.search_kind(), "target_adjacent": self.target_adjacent,
+                       "hunt_cells": self.hunt_cells, "nodes": nodes}, myfile)
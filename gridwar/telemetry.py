@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Reports the progress of long running simulations of Gridwar.
+"""
+
+import collections
+import os
+import time
+
+class Progress:
+    """
+    Periodically reports how a simulation is progressing. Reporting is sampled by time so the
+    caller only needs to pass its counters into update(), which returns straight away unless
+    the reporting interval has elapsed.
+    """
+    __slots__ = ('interval', 'metrics_file', 'window', 'samples', 'next_report', 'start_time')
+
+    def __init__(self, interval, metrics_file=None, window=6):
+        self.interval = interval
+        self.metrics_file = metrics_file
+        # Number of reports to keep when calculating the rolling games/sec figure
+        self.window = window
+        self.samples = collections.deque(maxlen=window + 1)
+        self.next_report = 0
+        self.start_time = 0
+
+    def start(self, games_done=0):
+        """
+        Start timing the simulation.
+        """
+        self.start_time = time.time()
+        self.samples.clear()
+        self.samples.append((self.start_time, games_done))
+        self.next_report = self.start_time + self.interval
+
+    def update(self, games_done, num_games, wins):
+        """
+        Report progress if the reporting interval has elapsed.
+        """
+        now = time.time()
+        if now < self.next_report:
+            return
+        self.next_report = now + self.interval
+        self.report(now, games_done, num_games, wins)
+
+    def report(self, now, games_done, num_games, wins):
+        """
+        Print the current progress and write out the metrics file (if one was requested).
+        """
+        self.samples.append((now, games_done))
+        first_time, first_games = self.samples[0]
+        rate = 0.0
+        if now > first_time:
+            rate = (games_done - first_games) / (now - first_time)
+        eta = None
+        if rate > 0:
+            eta = (num_games - games_done) / rate
+        rates = [float(win) / games_done if games_done else 0.0 for win in wins]
+
+        print("Progress: {}/{} games ({:.1f}%), {:.1f} games/sec, ETA {}, win rates: {}".
+              format(games_done, num_games, 100.0 * games_done / num_games if num_games else 100.0,
+                     rate, "{:.0f}s".format(eta) if eta is not None else "unknown",
+                     ", ".join("P{} {:.3f}".format(i+1, r) for i, r in enumerate(rates))),
+              flush=True)
+
+        if self.metrics_file is not None:
+            self.write_metrics(now, games_done, num_games, wins, rate, eta)
+
+    def write_metrics(self, now, games_done, num_games, wins, rate, eta):
+        """
+        Write the metrics in the Prometheus text format. The file is replaced atomically so a
+        scraper never sees a partially written file.
+        """
+        lines = ["# HELP gridwar_games_completed Number of games completed.",
+                 "# TYPE gridwar_games_completed gauge",
+                 "gridwar_games_completed {}".format(games_done),
+                 "# HELP gridwar_games_total Number of games to be played.",
+                 "# TYPE gridwar_games_total gauge",
+                 "gridwar_games_total {}".format(num_games),
+                 "# HELP gridwar_games_per_second Games per second over the rolling window.",
+                 "# TYPE gridwar_games_per_second gauge",
+                 "gridwar_games_per_second {:.3f}".format(rate),
+                 "# HELP gridwar_eta_seconds Estimated number of seconds until the run ends.",
+                 "# TYPE gridwar_eta_seconds gauge",
+                 "gridwar_eta_seconds {}".format("{:.1f}".format(eta) if eta is not None else "NaN"),
+                 "# HELP gridwar_elapsed_seconds Number of seconds since the run started.",
+                 "# TYPE gridwar_elapsed_seconds gauge",
+                 "gridwar_elapsed_seconds {:.1f}".format(now - self.start_time),
+                 "# HELP gridwar_wins Number of games won by each player.",
+                 "# TYPE gridwar_wins gauge"]
+        lines += ['gridwar_wins{{player="{}"}} {}'.format(i+1, win) for i, win in enumerate(wins)]
+        lines += ["# HELP gridwar_win_rate Fraction of completed games won by each player.",
+                  "# TYPE gridwar_win_rate gauge"]
+        lines += ['gridwar_win_rate{{player="{}"}} {:.6f}'.
+                  format(i+1, float(win) / games_done if games_done else 0.0) for i, win in enumerate(wins)]
+
+        tmp_file = "{}.tmp".format(self.metrics_file)
+        with open(tmp_file, 'w') as myfile:
+            myfile.write("\n".join(lines) + "\n")
+        os.replace(tmp_file, self.metrics_file)
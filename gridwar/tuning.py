@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""
+Tunes the parameters of a play strategy using successive halving.
+"""
+
+import itertools
+import multiprocessing
+import random
+import time
+
+from gridwar.gridwar import shots_to_kill
+from gridwar.plays import PlayBase
+from gridwar.utils import GameError
+
+def _evaluate(task):
+    """
+    Plays a batch of games for one candidate, returning its index and the total number of shots
+    taken. Defined at module level so it can be sent to worker processes.
+    """
+    index, seed, num_games, width, height, pieces, layout, play, params = task
+    random.seed(seed)
+    total = 0
+    for _ in range(num_games):
+        total += shots_to_kill(width, height, pieces, layout, play, params)
+    return index, total
+
+class Tuner:
+    """
+    Searches the parameter space of a play with successive halving. Every candidate starts off
+    with a few games and after each round only the best fraction survive, with the number of
+    games played per candidate growing by the same factor. Candidates are scored on the average
+    number of shots needed to sink the fleet of a board set-up with the given layout.
+    """
+    __slots__ = ('size', 'pieces', 'layout', 'play', 'num_candidates', 'min_games', 'eta',
+                 'processes', 'seed')
+
+    def __init__(self, width, height, pieces, layout, play, num_candidates=32, min_games=20, eta=2,
+                 processes=None, seed=None):
+        if not PlayBase.get_class(play).param_space_for(pieces):
+            raise GameError("Play '{}' does not have any parameters to tune".format(play))
+        if eta < 2:
+            raise GameError("Successive halving needs a reduction factor of at least 2 (not {})".format(eta))
+        if num_candidates < 1 or min_games < 1:
+            raise GameError("Tuning needs at least one candidate and one game per candidate")
+
+        self.size = (width, height)
+        self.pieces = pieces
+        self.layout = layout
+        self.play = play
+        self.num_candidates = num_candidates
+        self.min_games = min_games
+        self.eta = eta
+        self.processes = processes if processes else multiprocessing.cpu_count()
+        self.seed = seed
+
+    def candidates(self, rng):
+        """
+        Pick the candidate parameter sets. If there are more combinations than candidates
+        required then sample them at random.
+        """
+        space = PlayBase.get_class(self.play).param_space_for(self.pieces)
+        names = sorted(space)
+        combos = list(itertools.product(*(space[name] for name in names)))
+        if len(combos) > self.num_candidates:
+            combos = rng.sample(combos, self.num_candidates)
+        return [dict(zip(names, combo)) for combo in combos]
+
+    def run(self):
+        """
+        Runs the search and returns the best parameters found along with their average number
+        of shots.
+        """
+        rng = random.Random(self.seed)
+        candidates = self.candidates(rng)
+        shots = [0] * len(candidates)
+        games = [0] * len(candidates)
+        survivors = list(range(len(candidates)))
+        games_per_round = self.min_games
+        total_games = 0
+        full_sweep = 0
+        start_time = time.time()
+
+        print("Tuning play '{}' against layout '{}' with {} candidates on {} processes".
+              format(self.play, self.layout, len(candidates), self.processes))
+
+        with multiprocessing.Pool(self.processes) as pool:
+            round_num = 0
+            while True:
+                round_num += 1
+                # Split each candidate's games into batches so all the processes are kept busy even
+                # when only a few candidates remain
+                batches = max(1, min(games_per_round, -(-self.processes // len(survivors))))
+                tasks = []
+                for index in survivors:
+                    for batch in range(batches):
+                        num_games = games_per_round // batches + (1 if batch < games_per_round % batches else 0)
+                        tasks.append((index, rng.getrandbits(64), num_games, self.size[0], self.size[1],
+                                      self.pieces, self.layout, self.play, candidates[index]))
+                for index, total in pool.imap_unordered(_evaluate, tasks):
+                    shots[index] += total
+                for index in survivors:
+                    games[index] += games_per_round
+                total_games += games_per_round * len(survivors)
+
+                survivors.sort(key=lambda i: (float(shots[i]) / games[i], i))
+                best = survivors[0]
+                print("Round {}: {} candidates with {} games each, best average shots {:.2f} using {}".
+                      format(round_num, len(survivors), games[best], float(shots[best]) / games[best],
+                             candidates[best]))
+
+                # Stop as soon as a single candidate is left, as playing it on its own would not
+                # change the result
+                survivors = survivors[:max(1, len(survivors) // self.eta)]
+                if len(survivors) == 1:
+                    full_sweep = games[best] * len(candidates)
+                    break
+                games_per_round *= self.eta
+
+        print("Tuning took: {:.2f} seconds playing {} games ({:.1f}% of a full sweep at {} games each)".
+              format(time.time() - start_time, total_games, 100.0 * total_games / full_sweep, games[best]))
+        return candidates[best], float(shots[best]) / games[best]
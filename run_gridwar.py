@@ -8,11 +8,18 @@ to have a higher chance of success.
 
 import argparse
 import json
+import os
+import random
 
+from gridwar.checkpoint import Checkpoint
 from gridwar.gridwar import Game
 from gridwar.utils import GameError
 from gridwar.layouts import LayoutBase
-from gridwar.plays import PlayBase
+from gridwar.matchup import ShotsCache, Tournament, matchup
+from gridwar.plays import PlayBase, PlaySolved
+from gridwar.solver import Solver, policy_filename
+from gridwar.telemetry import Progress
+from gridwar.tuning import Tuner
 
 def main():
     """ Main application entry-point for grid war simulation. """
@@ -28,6 +35,38 @@ def main():
                         action='store_true')
     parser.add_argument('--verbose', help="Enable verbose output whilst running simulation",
                         action='store_true')
+    parser.add_argument('--progress', help="Report progress every PROGRESS seconds whilst running simulation",
+                        dest="progress", type=float, default=None)
+    parser.add_argument('--metrics-file', help="Write progress metrics in Prometheus text format to this file",
+                        dest="metrics_file", type=str, default=None)
+    parser.add_argument('--tune', help="Tune the parameters of player one's play strategy (against player two's "
+                        "layout) instead of running the simulation", action='store_true')
+    parser.add_argument('--paired', help="Play mirrored pairs of games with common random numbers, swapping "
+                        "which play strategy shoots first, and report the paired differences in wins and in shots "
+                        "needed to sink a fleet (both players must use the same layout)", action='store_true')
+    parser.add_argument('--checkpoint', help="Periodically save the simulation state to this file",
+                        dest="checkpoint", type=str, default=None)
+    parser.add_argument('--checkpoint-interval', help="Number of seconds between checkpoints",
+                        dest="checkpoint_interval", type=float, default=60.0)
+    parser.add_argument('--resume', help="Resume the simulation from its checkpoint (gridwar.ckpt unless "
+                        "--checkpoint is given)", action='store_true')
+    parser.add_argument('--matchup', help="Predict the result of the games from one-sided samples of each "
+                        "player's shots distribution (cached on disk) instead of playing them", action='store_true')
+    parser.add_argument('--tournament', help="Predict the results of every pairing of the plays listed in the "
+                        "configuration (or all plays) from cached shots distributions", action='store_true')
+    parser.add_argument('--cache-dir', help="Directory used to cache shots distributions",
+                        dest="cache_dir", type=str, default=".gridwar_cache")
+    parser.add_argument('--refresh-cache', help="Sample the shots distributions again rather than reusing those "
+                        "already cached", dest="refresh_cache", action='store_true')
+    parser.add_argument('--solve', help="Work out the best play for the board size and pieces, saving it for use "
+                        "by PlaySolved (only practical up to 4x4 with three pieces, unless the search is restricted by "
+                        "setting hunt_cells in the configuration's solve section, which reaches 5x5 with three pieces "
+                        "or 6x6 with two)", action='store_true')
+    parser.add_argument('--fleet-time-limit', help="Number of seconds a layout may spend searching for an "
+                        "arrangement of the pieces when placing them at random keeps failing",
+                        dest="fleet_time_limit", type=float, default=LayoutBase.fleet_time_limit)
+    parser.add_argument('--policy-dir', help="Directory solved policies are saved to and read from by PlaySolved",
+                        dest="policy_dir", type=str, default=".")
     args = parser.parse_args()
 
     print("Running simulation with configuration: {}".format(args.config))
@@ -48,12 +87,85 @@ def main():
             for i, piece in enumerate(config["pieces"].split(",")):
                 pieces[chr(i+65)] = int(piece)
 
+            LayoutBase.fleet_time_limit = args.fleet_time_limit
+            PlaySolved.policy_dir = args.policy_dir
+            play_params = (config.get("play_params", {}).get("p1"), config.get("play_params", {}).get("p2"))
+
+            if args.solve:
+                solve = config.get("solve", {})
+                solver = Solver(config["width"], config["height"], pieces, solve.get("max_entries", 1000000),
+                                solve.get("time_limit"), solve.get("target_adjacent", True), solve.get("hunt_cells"))
+                value, nodes = solver.solve()
+                os.makedirs(args.policy_dir, exist_ok=True)
+                filename = policy_filename(config["width"], config["height"], pieces, args.policy_dir)
+                solver.save(filename, value, nodes)
+                results = {"exact": "Best possible play needs {:.4f} shots on average",
+                           "homing": "Best play homing in on hits needs {:.4f} shots on average",
+                           "restricted": "Restricted search found a play needing {:.4f} shots on average (an upper "
+                                         "bound on the best possible)"}
+                print((results[solver.search_kind()] + ", policy saved to '{}'").format(value, filename))
+                return
+
+            if args.tune:
+                tune = config.get("tune", {})
+                tuner = Tuner(config["width"], config["height"], pieces, config["layout"]["p2"], config["play"]["p1"],
+                              tune.get("candidates", 32), tune.get("min_games", 20), tune.get("eta", 2),
+                              tune.get("processes"), config.get("seed"))
+                params, average = tuner.run()
+                print("Best parameters for '{}': {} (average number of shots: {:.2f})".
+                      format(config["play"]["p1"], json.dumps(params), average))
+                return
+
+            if args.matchup or args.tournament:
+                if "seed" in config:
+                    random.seed(config["seed"])
+                cache = ShotsCache(args.cache_dir, args.refresh_cache)
+                if args.tournament:
+                    plays = [name for name in PlayBase.play_names()
+                             if PlayBase.get_class(name).available(config["width"], config["height"], pieces)]
+                    Tournament(config["width"], config["height"], pieces, config["layout"]["p1"],
+                               config["layout"]["p2"], config.get("tournament", plays), config["num_games"], cache).run()
+                    return
+
+                # Player one attacks player two's layout and vice versa
+                hists = (cache.sample(config["width"], config["height"], pieces, config["layout"]["p2"],
+                                      config["play"]["p1"], config["num_games"], play_params[0]),
+                         cache.sample(config["width"], config["height"], pieces, config["layout"]["p1"],
+                                      config["play"]["p2"], config["num_games"], play_params[1]))
+                wins, rounds = matchup(*hists)
+                for i in range(2):
+                    print("Player {} win rate: {:.4f} with (average number of rounds: {:.2f})".
+                          format(i+1, wins[i], rounds[i]))
+                return
+
+            progress = None
+            if args.progress is not None or args.metrics_file is not None:
+                progress = Progress(args.progress if args.progress is not None else 10.0, args.metrics_file)
+
+            checkpoint = None
+            if args.resume and args.checkpoint is None:
+                args.checkpoint = "gridwar.ckpt"
+            if args.checkpoint is not None:
+                checkpoint = Checkpoint(args.checkpoint, args.checkpoint_interval)
+
+            # Seeding makes a run repeatable (resuming restores the generator from the checkpoint)
+            if "seed" in config:
+                random.seed(config["seed"])
+
             game = Game(config["width"], config["height"], config["num_games"], pieces,
                         config["layout"]["p1"], config["play"]["p1"],
-                        config["layout"]["p2"], config["play"]["p2"], args.verbose)
+                        config["layout"]["p2"], config["play"]["p2"], args.verbose, progress, play_params, checkpoint)
+
+            if args.resume:
+                game.resume("paired" if args.paired else "single")
 
-            game.play()
-            game.display_stats()
+            if args.paired:
+                game.play_paired()
+                game.display_stats()
+                game.display_paired_stats()
+            else:
+                game.play()
+                game.display_stats()
     except GameError as err:
         print("Simulation failed with the error:\n\t{}".format(err.msg))
 